@@ -1,115 +1,184 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
 from datetime import timedelta
 
-def get_adjusted_date(dt):
-    if dt.hour < 7:
-        return dt - pd.Timedelta(days=1)
-    return dt
+def get_adjusted_date(dt: pd.Series) -> pd.Series:
+    return dt - pd.to_timedelta((dt.dt.hour < 7).astype('int64'), unit='D')
 
-def process_trades(df: pd.DataFrame) -> pd.DataFrame:
+def format_dates(dates: pd.Series, unit: str) -> pd.Series:
     """
-    取引履歴データを処理し、各決済取引に保有時間、ロット数、取引種別、決済年月を付与する。
+    日時列を unit='M' なら 'YYYY-MM'、unit='D' なら 'YYYY-MM-DD' の文字列に変換する。NaT は欠損のまま残す。
     """
-    df['約定日時'] = pd.to_datetime(df['約定日時'])
-    for col in ['約定数量', '約定単価', '建単価', '実現損益（円貨）']:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    formatted = pd.Series(dates.to_numpy().astype(f'datetime64[{unit}]').astype(str), index=dates.index)
+    return formatted.where(dates.notna())
+
+def category_mask(series: pd.Series, pattern: str) -> pd.Series:
+    """
+    カテゴリ型の列で、カテゴリ名が pattern（正規表現）に一致する行を True とするマスクを返す。
+    """
+    categories = series.cat.categories
+    return series.isin(categories[categories.str.contains(pattern)])
 
-    new_trades = df[df['取引区分'].str.contains('新規', na=False)].copy()
-    closed_trades = df[df['取引区分'].str.contains('決済|ロスカット', na=False)].copy()
+def process_trades(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    取引履歴データを処理し、各決済取引に保有時間、ロット数、取引種別を付与する。
+    決済年月・決済日は load_trade_history が付与した列をそのまま引き継ぐため、df にはそれらの列が必要。
+    """
+    new_trades = df[category_mask(df['取引区分'], '新規')]
+    closed_trades = df[category_mask(df['取引区分'], '決済|ロスカット')]
 
     if closed_trades.empty:
         return pd.DataFrame()
 
-    new_trades['残り数量'] = new_trades['約定数量']
     new_trades = new_trades.sort_values(by='約定日時').reset_index(drop=True)
+    closed_trades = closed_trades.sort_values(by='約定日時').reset_index(drop=True)
+
+    close_pos, open_pos, matched_qty = match_trades_fifo(new_trades, closed_trades)
 
-    results = []
-
-    for _, closed_trade in closed_trades.sort_values(by='約定日時').iterrows():
-        adjusted_date = get_adjusted_date(closed_trade['約定日時'])
-        closed_qty = closed_trade['約定数量']
-        is_matched = False
-        
-        potential_matches = new_trades[
-            (new_trades['銘柄名'] == closed_trade['銘柄名']) &
-            (new_trades['約定単価'] == closed_trade['建単価']) &
-            (new_trades['残り数量'] > 0) &
-            (new_trades['約定日時'] < closed_trade['約定日時'])
-        ]
-
-        for match_index, new_trade in potential_matches.iterrows():
-            if closed_qty <= 0:
-                break
-            
-            is_matched = True
-            matched_qty = min(closed_qty, new_trade['残り数量'])
-            
-            is_fx = 'JPY' in closed_trade['銘柄名'] or 'USD' in closed_trade['銘柄名'] or 'EUR' in closed_trade['銘柄名']
-            lot_size = 10000 if is_fx else 1
-            normalized_lot = matched_qty / lot_size
-            trade_type = 'FX' if is_fx else 'CFD'
-
-            holding_time = closed_trade['約定日時'] - new_trade['約定日時']
-            position_type = 'ロング' if closed_trade['売買区分'] == '売' else 'ショート'
-            pro_rata_profit = (closed_trade['実現損益（円貨）'] / closed_trade['約定数量']) * matched_qty if closed_trade['約定数量'] != 0 else 0
-
-            results.append({
-                '銘柄名': closed_trade['銘柄名'],
-                'ポジション': position_type,
-                '実現損益（円貨）': pro_rata_profit,
-                '保有時間': holding_time,
-                'ロット数': normalized_lot,
-                '取引種別': trade_type,
-                '決済年月': adjusted_date.strftime('%Y-%m'),
-                '決済日': adjusted_date.strftime('%Y-%m-%d')
-            })
-
-            new_trades.at[match_index, '残り数量'] -= matched_qty
-            closed_qty -= matched_qty
-
-        if not is_matched:
-            is_fx = 'JPY' in closed_trade['銘柄名'] or 'USD' in closed_trade['銘柄名'] or 'EUR' in closed_trade['銘柄名']
-            lot_size = 10000 if is_fx else 1
-            normalized_lot = closed_trade['約定数量'] / lot_size
-            trade_type = 'FX' if is_fx else 'CFD'
-            position_type = 'ロング' if closed_trade['売買区分'] == '売' else 'ショート'
-
-            results.append({
-                '銘柄名': closed_trade['銘柄名'],
-                'ポジション': position_type,
-                '実現損益（円貨）': closed_trade['実現損益（円貨）'],
-                '保有時間': pd.NaT,
-                'ロット数': normalized_lot,
-                '取引種別': trade_type,
-                '決済年月': adjusted_date.strftime('%Y-%m'),
-                '決済日': adjusted_date.strftime('%Y-%m-%d')
-            })
-
-    return pd.DataFrame(results)
+    closed = closed_trades.iloc[close_pos].reset_index(drop=True)
+    is_matched = open_pos >= 0
+
+    symbols = closed['銘柄名'].unique()
+    fx_map = dict(zip(symbols, pd.Series(symbols).str.contains('JPY|USD|EUR', na=False).to_numpy()))
+    is_fx = closed['銘柄名'].map(fx_map).to_numpy(dtype=bool)
+    lot_size = np.where(is_fx, 10000, 1)
+    closed_qty = closed['約定数量'].to_numpy()
+    closed_profit = closed['実現損益（円貨）'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pro_rata_profit = np.where(closed_qty != 0, closed_profit / closed_qty * matched_qty, 0)
+
+    holding_time = pd.Series(pd.NaT, index=closed.index, dtype='timedelta64[ns]')
+    holding_time[is_matched] = (
+        closed['約定日時'].to_numpy()[is_matched] - new_trades['約定日時'].to_numpy()[open_pos[is_matched]]
+    )
+
+    return pd.DataFrame({
+        '銘柄名': closed['銘柄名'],
+        'ポジション': np.where(closed['売買区分'] == '売', 'ロング', 'ショート'),
+        '実現損益（円貨）': np.where(is_matched, pro_rata_profit, closed_profit),
+        '保有時間': holding_time,
+        'ロット数': matched_qty / lot_size,
+        '取引種別': np.where(is_fx, 'FX', 'CFD'),
+        '決済年月': closed['決済年月'],
+        '決済日': closed['決済日'],
+    })
+
+QTY_SCALE = 10**6
+
+def to_qty_units(qty) -> np.ndarray:
+    """
+    約定数量を QTY_SCALE 倍して整数に丸める。小数第6位までの数量なら累積しても誤差が出ない。
+    """
+    return np.rint(np.asarray(qty, dtype='float64') * QTY_SCALE).astype('int64')
+
+def match_trades_fifo(new_trades: pd.DataFrame, closed_trades: pd.DataFrame):
+    """
+    約定日時順に並んだ新規取引と決済取引を、銘柄名と建単価（新規側は約定単価）ごとにFIFO方式で対応付ける。
+    決済取引の位置、対応する新規取引の位置（対応なしは-1）、対応数量（対応なしは決済の約定数量）の配列を返す。
+    """
+    n_new = len(new_trades)
+    keys = pd.concat([
+        new_trades[['銘柄名', '約定単価']].set_axis(['銘柄名', '単価'], axis=1),
+        closed_trades[['銘柄名', '建単価']].set_axis(['銘柄名', '単価'], axis=1),
+    ], ignore_index=True)
+    group_ids = keys.groupby(['銘柄名', '単価'], sort=False, observed=True).ngroup().fillna(-1).to_numpy(dtype='int64')
+    _, time_rank = np.unique(
+        np.concatenate([new_trades['約定日時'].to_numpy(), closed_trades['約定日時'].to_numpy()]),
+        return_inverse=True,
+    )
+    # (グループ, 約定日時) を1つの整数キーにまとめ、グループ内の時系列順を保ったまま並べる
+    key_base = time_rank.max() + 1
+    sort_keys = group_ids * key_base + time_rank
+
+    new_group = group_ids[:n_new]
+    new_order = np.argsort(new_group, kind='stable')
+    new_order = new_order[new_group[new_order] >= 0]
+    new_keys = sort_keys[:n_new][new_order]
+    # 新規取引の累積数量。丸め誤差で隣のグループに食い込まないよう、QTY_SCALE 倍した整数で計算する
+    cum = np.concatenate([[0], np.cumsum(to_qty_units(new_trades['約定数量'].to_numpy()[new_order]))])
+
+    close_group = group_ids[n_new:]
+    close_order = np.argsort(close_group, kind='stable')
+    close_group = close_group[close_order]
+    close_qty = closed_trades['約定数量'].to_numpy()[close_order]
+    # 決済取引ごとに、同じグループの新規取引のうち約定日時が前のものは位置 [start_idx, available_idx) にある
+    start_idx = np.searchsorted(new_keys, close_group * key_base, side='left')
+    available_idx = np.searchsorted(new_keys, sort_keys[n_new:][close_order], side='left')
+    group_start = cum[start_idx]
+    available = cum[available_idx] - group_start
+
+    # 消化済み数量 C_k = min(C_{k-1} + q_k, A_k) は Q_k + min(0, min_{j<=k}(A_j - Q_j)) で一括計算できる
+    close_cum = pd.Series(to_qty_units(close_qty)).groupby(close_group).cumsum().to_numpy()
+    shortfall = pd.Series(available - close_cum).groupby(close_group).cummin().to_numpy()
+    consumed_end = group_start + close_cum + np.minimum(shortfall, 0)
+    is_group_head = np.concatenate([[True], close_group[1:] != close_group[:-1]])
+    consumed_start = np.where(is_group_head, group_start, np.roll(consumed_end, 1))
+
+    # 各決済取引が消化した区間 [consumed_start, consumed_end] と重なる新規取引を、同じグループの範囲内で展開する
+    has_fill = consumed_end > consumed_start
+    lo = np.maximum(np.searchsorted(cum[1:], consumed_start[has_fill], side='right'), start_idx[has_fill])
+    hi = np.minimum(np.searchsorted(cum[:-1], consumed_end[has_fill], side='left'), available_idx[has_fill])
+    counts = np.maximum(hi - lo, 0)
+    fill_close = np.repeat(np.flatnonzero(has_fill), counts)
+    fill_open = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    fill_qty = np.minimum(cum[fill_open + 1], consumed_end[fill_close]) - np.maximum(cum[fill_open], consumed_start[fill_close])
+    keep = fill_qty > 0
+    fill_close, fill_open, fill_qty = fill_close[keep], fill_open[keep], fill_qty[keep] / QTY_SCALE
+
+    unmatched = np.setdiff1d(np.arange(len(close_order)), fill_close)
+    close_pos = np.concatenate([close_order[fill_close], close_order[unmatched]])
+    open_pos = np.concatenate([new_order[fill_open], np.full(len(unmatched), -1)])
+    matched_qty = np.concatenate([fill_qty, close_qty[unmatched]])
+
+    # 決済取引の約定日時順、同一決済内では新規取引の約定日時順に並べ直す
+    order = np.lexsort((open_pos, close_pos))
+    return close_pos[order], open_pos[order], matched_qty[order]
+
+def prepare_summary_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    集計の前処理として、1ロットあたり損益と勝ち/負け別の補助列を付与する。
+    """
+    profit = pd.to_numeric(df['実現損益（円貨）'], errors='coerce').fillna(0)
+    per_lot = (profit / df['ロット数']).replace([float('inf'), -float('inf')], 0).fillna(0)
+    win = profit > 0
+    loss = profit < 0
+
+    return df.assign(**{
+        '実現損益（円貨）': profit,
+        '1ロットあたり損益': per_lot,
+        '_win': win,
+        '_loss': loss,
+        '_win_time': df['保有時間'].where(win),
+        '_loss_time': df['保有時間'].where(loss),
+        '_win_lot': per_lot.where(win),
+        '_loss_lot': per_lot.where(loss),
+        '_profit': profit.clip(lower=0),
+        '_loss_amount': profit.clip(upper=0),
+    })
 
 def analyze_summary(df: pd.DataFrame, group_by_cols: list) -> pd.DataFrame:
+    """
+    prepare_summary_data で前処理したデータを group_by_cols ごとに集計する。
+    """
     if df.empty:
         return pd.DataFrame()
 
-    df['実現損益（円貨）'] = pd.to_numeric(df['実現損益（円貨）'], errors='coerce').fillna(0)
-    df['1ロットあたり損益'] = (df['実現損益（円貨）'] / df['ロット数']).replace([float('inf'), -float('inf')], 0).fillna(0)
-
-    summary = df.groupby(group_by_cols).apply(lambda g: pd.Series({
-        '総損益': g['実現損益（円貨）'].sum(),
-        '取引回数': len(g),
-        '勝ち数': (g['実現損益（円貨）'] > 0).sum(),
-        '負け数': (g['実現損益（円貨）'] < 0).sum(),
-        '勝ち平均時間': g[g['実現損益（円貨）'] > 0]['保有時間'].mean() if not g[g['実現損益（円貨）'] > 0].empty else pd.NaT,
-        '負け平均時間': g[g['実現損益（円貨）'] < 0]['保有時間'].mean() if not g[g['実現損益（円貨）'] < 0].empty else pd.NaT,
-        '1ロット利益': g[g['実現損益（円貨）'] > 0]['1ロットあたり損益'].mean(),
-        '1ロット損失': g[g['実現損益（円貨）'] < 0]['1ロットあたり損益'].mean(),
-    })).reset_index()
-
-    summary['勝率'] = (summary['勝ち数'] / summary['取引回数'] * 100).fillna(0)
-    summary['総利益'] = df[df['実現損益（円貨）'] > 0].groupby(group_by_cols)['実現損益（円貨）'].sum().reindex(summary.set_index(group_by_cols).index).fillna(0).values
-    summary['総損失'] = df[df['実現損益（円貨）'] < 0].groupby(group_by_cols)['実現損益（円貨）'].sum().reindex(summary.set_index(group_by_cols).index).fillna(0).values
+    summary = df.groupby(group_by_cols, observed=True).agg(**{
+        '総損益': ('実現損益（円貨）', 'sum'),
+        '取引回数': ('実現損益（円貨）', 'size'),
+        '勝ち数': ('_win', 'sum'),
+        '負け数': ('_loss', 'sum'),
+        '勝ち平均時間': ('_win_time', 'mean'),
+        '負け平均時間': ('_loss_time', 'mean'),
+        '1ロット利益': ('_win_lot', 'mean'),
+        '1ロット損失': ('_loss_lot', 'mean'),
+        '総利益': ('_profit', 'sum'),
+        '総損失': ('_loss_amount', 'sum'),
+    }).reset_index()
+
+    summary.insert(summary.columns.get_loc('総利益'), '勝率', (summary['勝ち数'] / summary['取引回数'] * 100).fillna(0))
     summary['PF'] = (summary['総利益'] / abs(summary['総損失'])).fillna(float('inf'))
     summary['平均利益'] = (summary['総利益'] / summary['勝ち数']).fillna(0)
     summary['平均損失'] = (summary['総損失'] / summary['負け数']).fillna(0)
@@ -146,30 +215,78 @@ def style_and_format_summary(df: pd.DataFrame):
         '負け平均時間': format_timedelta,
     }
 
-    def color_positive_negative(val):
-        if not pd.api.types.is_number(val) or pd.isna(val): return ''
-        color = 'blue' if val > 0 else 'red' if val < 0 else 'black'
-        return f'color: {color}'
+    def to_float(col):
+        return pd.to_numeric(col, errors='coerce').to_numpy(dtype=float)
+
+    def color_positive_negative(col):
+        values = to_float(col)
+        colors = np.where(values > 0, 'color: blue', np.where(values < 0, 'color: red', 'color: black'))
+        return np.where(np.isnan(values), '', colors)
 
-    def color_win_rate(val):
-        if not pd.api.types.is_number(val) or pd.isna(val): return ''
-        color = 'blue' if val >= 50 else 'red'
-        return f'color: {color}'
+    def color_win_rate(col):
+        values = to_float(col)
+        return np.where(np.isnan(values), '', np.where(values >= 50, 'color: blue', 'color: red'))
 
-    def color_ratio(val):
-        if val == float('inf'): return 'color: blue'
-        if not pd.api.types.is_number(val) or pd.isna(val): return ''
-        color = 'blue' if val >= 1 else 'red'
-        return f'color: {color}'
+    def color_ratio(col):
+        values = to_float(col)
+        return np.where(np.isnan(values), '', np.where(np.isposinf(values) | (values >= 1), 'color: blue', 'color: red'))
 
     styler = (df.style
-        .applymap(color_positive_negative, subset=[col for col in ['総損益', '売買損益', 'スワップ'] if col in df.columns])
-        .applymap(color_win_rate, subset=['勝率'])
-        .applymap(color_ratio, subset=['PF', 'RR'])
+        .apply(color_positive_negative, subset=[col for col in ['総損益', '売買損益', 'スワップ'] if col in df.columns], axis=0)
+        .apply(color_win_rate, subset=['勝率'], axis=0)
+        .apply(color_ratio, subset=['PF', 'RR'], axis=0)
         .format(format_dict, na_rep='N/A')
     )
     return styler
 
+CSV_COLUMNS = [
+    "約定日時","取引区分","受渡日","約定番号","銘柄名","銘柄コード","限月","コールプット区分","権利行使価格","権利行使価格通貨","カバードワラント商品種別","売買区分","通貨","受渡通貨","市場","口座","信用区分","約定数量","約定単価","コンバージョンレート","手数料","手数料消費税","建単価","新規手数料","新規手数料消費税","管理費","名義書換料","金利","貸株料","品貸料","前日分値洗","経過利子（円貨）","経過利子（外貨）","経過日数（外債）","所得税（外債）","地方税（外債）","金利・価格調整額（CFD）","配当金調整額（CFD）","金利・価格調整額（くりっく株365）","配当金調整額（くりっく株365）","売建単価（くりっく365/くりっく株365）","買建単価（くりっく365/くりっく株365）","円貨スワップ損益","外貨スワップ損益","約定金額（円貨）","約定金額（外貨）","決済金額（円貨）","決済金額（外貨）","実現損益（円貨）","実現損益（外貨）","実現損益（円換算額）","受渡金額（円貨）","受渡金額（外貨）","備考"
+]
+NUMERIC_COLUMNS = ['約定数量', '約定単価', '建単価', '実現損益（円貨）']
+CSV_DTYPES = {
+    '取引区分': 'category',
+    '銘柄名': 'category',
+    '売買区分': 'category',
+}
+
+@st.cache_data(show_spinner=False)
+def load_trade_history(raw_bytes: bytes) -> pd.DataFrame:
+    """
+    Shift-JISの取引履歴CSVから分析に使う列だけを読み込み、決済年月と決済日を付与する。
+    """
+    df = pd.read_csv(
+        io.BytesIO(raw_bytes), header=0, names=CSV_COLUMNS, encoding='shift_jis', engine='c',
+        usecols=['約定日時', *CSV_DTYPES, *NUMERIC_COLUMNS], dtype=CSV_DTYPES, parse_dates=['約定日時'],
+    )
+    # 空のファイルなどで parse_dates が効かず object 型のまま残る場合があるため、必ず日時型にそろえる
+    df['約定日時'] = pd.to_datetime(df['約定日時'])
+    # '-' などの数値でないセルは0として扱う
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['adjusted_date'] = get_adjusted_date(df['約定日時'])
+    df['決済年月'] = format_dates(df['adjusted_date'], 'M')
+    df['決済日'] = format_dates(df['adjusted_date'], 'D')
+    return df
+
+@st.cache_data(show_spinner=False)
+def analyze_trades(raw_bytes: bytes) -> dict:
+    """
+    取引履歴CSVを読み込み、決済取引の分析結果と、スワップ損益の合計・日別・月別・銘柄別集計をまとめて返す。
+    キャッシュのキーはアップロードされたバイト列そのものにする。
+    """
+    df = load_trade_history(raw_bytes)
+    swap_df = df[category_mask(df['取引区分'], 'スワップ')]
+    # 元データの集計は銘柄×日の1回だけにし、日別・月別・銘柄別はその小さな結果から求める
+    symbol_daily_swap = swap_df.groupby(['銘柄名', '決済日'], observed=True, dropna=False)['実現損益（円貨）'].sum()
+    daily_swap = symbol_daily_swap.groupby(level='決済日').sum()
+    return {
+        'analyzed': process_trades(df),
+        'total_swap': swap_df['実現損益（円貨）'].sum(),
+        'daily_swap': daily_swap,
+        'monthly_swap': daily_swap.groupby(daily_swap.index.str[:7].rename('決済年月')).sum(),
+        'symbol_swap': symbol_daily_swap.groupby(level='銘柄名', observed=True).sum(),
+    }
+
 # --- Streamlit App ---
 st.set_page_config(layout="wide")
 st.title('📈 GMO取引履歴分析アプリ')
@@ -180,33 +297,21 @@ uploaded_file = st.file_uploader("CSVファイルをアップロード", type=['
 if uploaded_file is not None:
     try:
         with st.spinner('ファイルを読み込み、分析中です...'):
-            string_io = io.StringIO(uploaded_file.getvalue().decode('shift_jis'))
-            
-            columns = [
-                "約定日時","取引区分","受渡日","約定番号","銘柄名","銘柄コード","限月","コールプット区分","権利行使価格","権利行使価格通貨","カバードワラント商品種別","売買区分","通貨","受渡通貨","市場","口座","信用区分","約定数量","約定単価","コンバージョンレート","手数料","手数料消費税","建単価","新規手数料","新規手数料消費税","管理費","名義書換料","金利","貸株料","品貸料","前日分値洗","経過利子（円貨）","経過利子（外貨）","経過日数（外債）","所得税（外債）","地方税（外債）","金利・価格調整額（CFD）","配当金調整額（CFD）","金利・価格調整額（くりっく株365）","配当金調整額（くりっく株365）","売建単価（くりっく365/くりっく株365）","買建単価（くりっく365/くりっく株365）","円貨スワップ損益","外貨スワップ損益","約定金額（円貨）","約定金額（外貨）","決済金額（円貨）","決済金額（外貨）","実現損益（円貨）","実現損益（外貨）","実現損益（円換算額）","受渡金額（円貨）","受渡金額（外貨）","備考"
-            ]
-            df = pd.read_csv(string_io, header=0, names=columns)
-
-            df['約定日時'] = pd.to_datetime(df['約定日時'])
-            df['adjusted_date'] = df['約定日時'].apply(get_adjusted_date)
-            df['決済年月'] = df['adjusted_date'].dt.strftime('%Y-%m')
-            df['決済日'] = df['adjusted_date'].dt.strftime('%Y-%m-%d')
-
-            swap_df = df[df['取引区分'].str.contains('スワップ', na=False)].copy()
-            total_swap_profit = swap_df['実現損益（円貨）'].sum()
-            monthly_swap_summary = swap_df.groupby('決済年月')['実現損益（円貨）'].sum().reset_index()
-            daily_swap_summary = swap_df.groupby('決済日')['実現損益（円貨）'].sum().reset_index()
-
-            analyzed_df = process_trades(df.copy())
+            analysis = analyze_trades(uploaded_file.getvalue())
+            analyzed_df = analysis['analyzed']
+            total_swap_profit = analysis['total_swap']
+            monthly_swap_summary = analysis['monthly_swap']
+            daily_swap_summary = analysis['daily_swap']
+            symbol_swap = analysis['symbol_swap']
 
             if not analyzed_df.empty:
-                fx_df = analyzed_df[analyzed_df['取引種別'] == 'FX']
-                cfd_df = analyzed_df[analyzed_df['取引種別'] == 'CFD']
+                fx_df = prepare_summary_data(analyzed_df[analyzed_df['取引種別'] == 'FX'])
+                cfd_df = prepare_summary_data(analyzed_df[analyzed_df['取引種別'] == 'CFD'])
 
                 # --- FXセクション ---
                 st.subheader('📊 FXサマリー')
                 if not fx_df.empty:
-                    fx_total_summary = analyze_summary(fx_df.copy(), ['取引種別'])
+                    fx_total_summary = analyze_summary(fx_df, ['取引種別'])
                     fx_total_summary.rename(columns={'総損益': '売買損益'}, inplace=True)
                     fx_total_summary['スワップ'] = total_swap_profit
                     fx_total_summary['総損益'] = fx_total_summary['売買損益'] + fx_total_summary['スワップ']
@@ -217,35 +322,35 @@ if uploaded_file is not None:
 
                     st.markdown("**FX 日次グラフ**")
                     fx_daily_summary = analyze_summary(fx_df, ['決済日'])
-                    fx_daily_for_chart = fx_daily_summary[['決済日', '総損益']]
-                    daily_swap_for_chart = daily_swap_summary.rename(columns={'実現損益（円貨）': 'スワップ損益'})
-                    chart_df_daily = pd.merge(fx_daily_for_chart, daily_swap_for_chart, on='決済日', how='outer').fillna(0)
+                    fx_daily_for_chart = fx_daily_summary.set_index('決済日')['総損益']
+                    daily_index = fx_daily_for_chart.index.union(daily_swap_summary.index).rename('決済日')
+                    chart_df_daily = pd.DataFrame({
+                        '総損益': fx_daily_for_chart.reindex(daily_index, fill_value=0),
+                        'スワップ損益': daily_swap_summary.reindex(daily_index, fill_value=0),
+                    })
                     chart_df_daily['日次合計損益'] = chart_df_daily['総損益'] + chart_df_daily['スワップ損益']
                     chart_df_daily['累積損益'] = chart_df_daily['日次合計損益'].cumsum()
-                    st.line_chart(chart_df_daily.set_index('決済日')['累積損益'])
+                    st.line_chart(chart_df_daily['累積損益'])
 
                     st.markdown("**FX 月別サマリー**")
                     fx_monthly_summary = analyze_summary(fx_df, ['決済年月'])
-                    fx_monthly_display = fx_monthly_summary.rename(columns={'総損益': '売買損益'})
-                    monthly_swap_df = monthly_swap_summary.rename(columns={'実現損益（円貨）': 'スワップ'})
-                    combined_monthly = pd.merge(fx_monthly_display, monthly_swap_df, on='決済年月', how='outer')
+                    fx_monthly_display = fx_monthly_summary.rename(columns={'総損益': '売買損益'}).set_index('決済年月')
+                    monthly_index = fx_monthly_display.index.union(monthly_swap_summary.index).rename('決済年月')
+                    combined_monthly = fx_monthly_display.reindex(monthly_index)
+                    combined_monthly['スワップ'] = monthly_swap_summary.reindex(monthly_index)
                     numeric_cols = ['売買損益', 'スワップ', '取引回数', '勝ち数', '負け数', '総利益', '総損失', '勝率', 'PF', '平均利益', '平均損失', 'RR', '1ロット利益', '1ロット損失']
-                    for col in numeric_cols:
-                        if col in combined_monthly.columns:
-                            combined_monthly[col] = combined_monthly[col].fillna(0)
+                    combined_monthly[numeric_cols] = combined_monthly[numeric_cols].fillna(0)
+                    combined_monthly = combined_monthly.reset_index()
                     combined_monthly['総損益'] = combined_monthly['売買損益'] + combined_monthly['スワップ']
                     fx_monthly_display_order = ['決済年月', '総損益', '売買損益', 'スワップ', '取引回数', '勝ち数', '負け数', '勝率', '総利益', '総損失','PF','平均利益', '平均損失', 'RR', '1ロット利益', '1ロット損失', '勝ち平均時間', '負け平均時間']
                     st.dataframe(style_and_format_summary(combined_monthly.sort_values(by='決済年月')[fx_monthly_display_order]), use_container_width=True)
 
                     st.markdown("**FX 銘柄別サマリー**")
                     fx_symbol_summary = analyze_summary(fx_df, ['銘柄名', 'ポジション'])
-                    symbol_swap_df = swap_df.groupby('銘柄名')['実現損益（円貨）'].sum().reset_index().rename(columns={'実現損益（円貨）': 'スワップ'})
-                    combined_symbol = pd.merge(fx_symbol_summary, symbol_swap_df, on='銘柄名', how='left')
-                    numeric_cols_symbol = ['総損益', 'スワップ', '取引回数', '勝ち数', '負け数', '総利益', '総損失', '勝率', 'PF', '平均利益', '平均損失', 'RR', '1ロット利益', '1ロット損失']
-                    for col in numeric_cols_symbol:
-                        if col in combined_symbol.columns:
-                            combined_symbol[col] = combined_symbol[col].fillna(0)
-                    combined_symbol.rename(columns={'総損益': '売買損益'}, inplace=True)
+                    combined_symbol = fx_symbol_summary.rename(columns={'総損益': '売買損益'})
+                    combined_symbol['スワップ'] = symbol_swap.reindex(combined_symbol['銘柄名']).to_numpy()
+                    numeric_cols_symbol = ['売買損益', 'スワップ', '取引回数', '勝ち数', '負け数', '総利益', '総損失', '勝率', 'PF', '平均利益', '平均損失', 'RR', '1ロット利益', '1ロット損失']
+                    combined_symbol[numeric_cols_symbol] = combined_symbol[numeric_cols_symbol].fillna(0)
                     combined_symbol['総損益'] = combined_symbol['売買損益'] + combined_symbol['スワップ']
                     fx_symbol_display_order = ['銘柄名', 'ポジション', '総損益', '売買損益', 'スワップ', '取引回数', '勝ち数', '負け数', '勝率', '総利益', '総損失','PF','平均利益', '平均損失', 'RR', '1ロット利益', '1ロット損失', '勝ち平均時間', '負け平均時間']
                     st.dataframe(style_and_format_summary(combined_symbol[fx_symbol_display_order]), use_container_width=True)
@@ -255,7 +360,7 @@ if uploaded_file is not None:
                 # --- CFDセクション ---
                 st.subheader('📈 CFDサマリー')
                 if not cfd_df.empty:
-                    cfd_total_summary = analyze_summary(cfd_df.copy(), ['取引種別']).rename(columns={'取引種別': '種類'})
+                    cfd_total_summary = analyze_summary(cfd_df, ['取引種別']).rename(columns={'取引種別': '種類'})
                     st.dataframe(style_and_format_summary(cfd_total_summary.set_index('種類')), use_container_width=True)
 
                     st.markdown("**CFD 日次グラフ**")
@@ -0,0 +1,97 @@
+import random
+from fractions import Fraction
+
+import pandas as pd
+
+import app
+
+
+def build_csv(rows):
+    df = pd.DataFrame(rows).reindex(columns=app.CSV_COLUMNS)
+    return df.to_csv(index=False).encode('shift_jis')
+
+
+def reference_fifo(rows):
+    """数量を Fraction で厳密に扱う素朴なFIFO。(銘柄名, 保有時間, ロット数) を決済の約定日時順に返す。"""
+    opens = [dict(r, 残り=Fraction(r['約定数量'])) for r in rows if r['取引区分'] == '新規']
+    results = []
+    for close in sorted((r for r in rows if r['取引区分'] == '決済'), key=lambda r: r['約定日時']):
+        remaining = Fraction(close['約定数量'])
+        matched = False
+        for o in sorted(opens, key=lambda r: r['約定日時']):
+            if remaining <= 0:
+                break
+            if (o['銘柄名'] != close['銘柄名'] or o['約定単価'] != close['建単価']
+                    or o['残り'] <= 0 or o['約定日時'] >= close['約定日時']):
+                continue
+            qty = min(remaining, o['残り'])
+            o['残り'] -= qty
+            remaining -= qty
+            matched = True
+            holding = pd.Timestamp(close['約定日時']) - pd.Timestamp(o['約定日時'])
+            results.append((close['銘柄名'], holding, float(qty)))
+        if not matched:
+            results.append((close['銘柄名'], pd.NaT, float(Fraction(close['約定数量']))))
+    return results
+
+
+def test_fractional_lots_match_exact_fifo():
+    symbols = ['ゴールド', '日本225', '米国30', 'WTI原油']
+    rng = random.Random(0)
+    for _ in range(30):
+        start = pd.Timestamp('2024-01-04 08:00:00')
+        rows = []
+        for i in range(60):
+            symbol = rng.choice(symbols)
+            rows.append({
+                '約定日時': (start + pd.Timedelta(minutes=17 * i)).strftime('%Y/%m/%d %H:%M:%S'),
+                '取引区分': rng.choice(['新規', '決済']),
+                '銘柄名': symbol,
+                '売買区分': rng.choice(['買', '売']),
+                '約定数量': rng.choice(['0.1', '0.2', '0.3']),
+                '約定単価': '100.0',
+                '建単価': '100.0',
+                '実現損益（円貨）': str(rng.randint(-500, 500)),
+            })
+
+        analyzed = app.process_trades(app.load_trade_history(build_csv(rows)))
+        actual = list(zip(analyzed['銘柄名'].astype(str), analyzed['保有時間'], analyzed['ロット数'].round(9)))
+        expected = [(s, h, round(q, 9)) for s, h, q in reference_fifo(rows)]
+
+        assert actual == expected
+        assert (analyzed['保有時間'].dropna() > pd.Timedelta(0)).all()
+
+
+def test_header_only_csv_has_no_closed_trades():
+    raw = build_csv([])
+
+    assert pd.api.types.is_datetime64_any_dtype(app.load_trade_history(raw)['約定日時'])
+    assert app.analyze_trades(raw)['analyzed'].empty
+
+
+def test_non_numeric_cells_are_treated_as_zero():
+    row = {
+        '約定日時': '2024/01/04 09:00:00', '取引区分': '決済', '銘柄名': 'ゴールド', '売買区分': '売',
+        '約定数量': '1', '約定単価': '2000.0', '建単価': '-', '実現損益（円貨）': '-',
+    }
+    df = app.load_trade_history(build_csv([row]))
+
+    assert df.loc[0, '建単価'] == 0
+    assert df.loc[0, '実現損益（円貨）'] == 0
+    assert pd.api.types.is_float_dtype(df['建単価'])
+
+
+def test_equal_length_uploads_are_analyzed_separately():
+    # 50,000行以上のDataFrameは st.cache_data のハッシュが標本抽出になるため、アップロードのバイト列で区別されることを確認する
+    rows = [{
+        '約定日時': (pd.Timestamp('2024-01-04 08:00:00') + pd.Timedelta(seconds=i)).strftime('%Y/%m/%d %H:%M:%S'),
+        '取引区分': '決済', '銘柄名': 'ゴールド', '売買区分': '売',
+        '約定数量': '1', '約定単価': '2000.0', '建単価': '2000.0', '実現損益（円貨）': '00005',
+    } for i in range(60000)]
+    original = build_csv(rows)
+    rows[12345] = dict(rows[12345], **{'実現損益（円貨）': '99994'})
+    modified = build_csv(rows)
+    assert len(original) == len(modified)
+
+    assert app.analyze_trades(original)['analyzed']['実現損益（円貨）'].sum() == 300000
+    assert app.analyze_trades(modified)['analyzed']['実現損益（円貨）'].sum() == 399989